@@ -0,0 +1,264 @@
+"""Stratified allocation, estimation, and stopping rules for adaptive sampling.
+
+Examples in the docstrings are checked with ``python -m doctest src/adaptive_sampling.py``.
+"""
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy import stats
+
+# A stratum's own SD is only trusted once it has this many paired differences.
+MIN_STRATUM_OBS = 5
+# Floor on any stratum's SD, as a fraction of the pooled SD, so constant
+# integer scores in a small stratum neither zero its allocation weight nor
+# collapse the stratified SE.
+SD_FLOOR_FRACTION = 0.25
+
+STOP_MODES = ("precision", "power")
+
+
+def stratum_label(year: Any, decision: Any) -> str:
+    """Key for a year/decision stratum, safe to use in JSON.
+
+    >>> stratum_label(2024, "Accept (poster)")
+    '2024/Accept (poster)'
+    """
+    return f"{year}/{decision}"
+
+
+def stratified_mean(
+    diffs: Sequence[float],
+    strata: Sequence[str],
+    stratum_sizes: Dict[str, int],
+    alpha: float = 0.05,
+) -> Dict[str, Any]:
+    """Stratified estimate of the mean paired difference.
+
+    Each sampled stratum is weighted by its population share W_h = N_h / N,
+    so mean = sum W_h * d_h and var = sum W_h^2 * s_h^2 / n_h. Strata with
+    fewer than ``MIN_STRATUM_OBS`` observations use the pooled SD, and every
+    s_h is floored at ``SD_FLOOR_FRACTION * pooled_sd``. Weights are
+    renormalised over the strata sampled so far; ``population_coverage`` is
+    the share of the population in those strata, and the estimate only
+    describes the whole population once it reaches 1.0.
+
+    >>> out = stratified_mean([1, 1, 0, 0], ["a", "a", "b", "b"], {"a": 30, "b": 30})
+    >>> round(out["mean_diff"], 3), round(out["se"], 3), out["df"]
+    (0.5, 0.289, 2)
+    >>> stratified_mean([1, 1], ["a", "a"], {"a": 30, "b": 10})["population_coverage"]
+    0.75
+
+    Constant differences within each stratum still give a positive SE when
+    the pooled SD is positive:
+
+    >>> diffs = [0] * 15 + [-1] * 5
+    >>> out = stratified_mean(diffs, list("aaaaabbbbbcccccddddd"), dict.fromkeys("abcd", 25))
+    >>> round(out["mean_diff"], 3), out["se"] > 0
+    (-0.25, True)
+
+    Oversampling a stratum does not shift the estimate:
+
+    >>> out = stratified_mean([1, 0, 0, 0, 0, 0], list("abbbbb"), {"a": 50, "b": 50})
+    >>> round(out["mean_diff"], 3), out["population_coverage"]
+    (0.5, 1.0)
+    """
+    values = np.asarray(diffs, dtype=float)
+    labels = np.asarray(strata, dtype=object)
+    mask = np.isfinite(values)
+    values, labels = values[mask], labels[mask]
+    n = len(values)
+    if n < 2:
+        return {
+            "n": n,
+            "strata": len(set(labels)),
+            "mean_diff": float("nan"),
+            "se": float("nan"),
+            "df": 0,
+            "ci_low": float("nan"),
+            "ci_high": float("nan"),
+            "population_coverage": float("nan"),
+        }
+
+    pooled_sd = float(np.std(values, ddof=1))
+    sd_floor = SD_FLOOR_FRACTION * pooled_sd
+    groups: Dict[str, List[float]] = defaultdict(list)
+    for value, label in zip(values, labels):
+        groups[label].append(value)
+
+    sampled_total = sum(stratum_sizes[label] for label in groups)
+    mean = 0.0
+    var = 0.0
+    for label, group in groups.items():
+        weight = stratum_sizes[label] / sampled_total
+        sd = float(np.std(group, ddof=1)) if len(group) >= MIN_STRATUM_OBS else pooled_sd
+        sd = max(sd, sd_floor)
+        mean += weight * float(np.mean(group))
+        var += weight**2 * sd**2 / len(group)
+
+    se = math.sqrt(var)
+    df = max(n - len(groups), 1)
+    half_width = float(stats.t.ppf(1 - alpha / 2, df) * se)
+    return {
+        "n": n,
+        "strata": len(groups),
+        "mean_diff": mean,
+        "se": se,
+        "df": df,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "population_coverage": sampled_total / sum(stratum_sizes.values()),
+    }
+
+
+def paired_power(effect: float, se: float, df: int, alpha: float = 0.05) -> float:
+    """Two-sided power of a t-test on the mean difference, given its SE.
+
+    >>> round(paired_power(0.5, 1.0 / math.sqrt(10), 9), 3)
+    0.293
+    >>> round(paired_power(0.5, 0.05, 49), 3), paired_power(0.5, 0.0, 49)
+    (1.0, 1.0)
+    >>> math.isnan(paired_power(0.5, float("nan"), 9))
+    True
+    """
+    if df < 1 or not np.isfinite(se):
+        return float("nan")
+    if se == 0:
+        return 1.0
+    noncentrality = effect / se
+    t_crit = stats.t.ppf(1 - alpha / 2, df)
+    # Use sf on both tails: nct.cdf returns nan deep in the lower tail.
+    return float(
+        stats.nct.sf(t_crit, df, noncentrality)
+        + stats.nct.sf(t_crit, df, -noncentrality)
+    )
+
+
+def stopping_reason(
+    estimate: Dict[str, Any],
+    power: float,
+    stop_on: str,
+    min_papers: int,
+    target_ci_half_width: float,
+    target_power: float,
+    min_coverage: float = 1.0,
+) -> Optional[str]:
+    """Return ``stop_on`` once its target is met, else None.
+
+    Never stops before ``min_papers`` or while the sampled strata cover less
+    than ``min_coverage`` of the population.
+
+    >>> est = {"n": 30, "ci_low": -0.2, "ci_high": 0.2, "population_coverage": 1.0}
+    >>> stopping_reason(est, 0.5, "precision", 20, 0.25, 0.8)
+    'precision'
+    >>> stopping_reason(est, 0.5, "power", 20, 0.25, 0.8) is None
+    True
+    >>> stopping_reason({**est, "n": 10}, 0.99, "precision", 20, 0.25, 0.8) is None
+    True
+    >>> stopping_reason({**est, "population_coverage": 0.9}, 0.5, "precision", 20, 0.25, 0.8) is None
+    True
+    """
+    if stop_on not in STOP_MODES:
+        raise ValueError(f"stop_on must be one of {STOP_MODES}, got {stop_on!r}")
+    if estimate["n"] < min_papers:
+        return None
+    coverage = estimate["population_coverage"]
+    if not np.isfinite(coverage) or coverage < min_coverage:
+        return None
+    if stop_on == "precision":
+        half_width = (estimate["ci_high"] - estimate["ci_low"]) / 2
+        if np.isfinite(half_width) and half_width <= target_ci_half_width:
+            return "precision"
+    elif np.isfinite(power) and power >= target_power:
+        return "power"
+    return None
+
+
+def allocate_wave(
+    pools: Dict[str, List[int]],
+    stratum_sizes: Dict[str, int],
+    stratum_sd: Dict[str, float],
+    pooled_sd: float,
+    wave_size: int,
+    sampled: Optional[Dict[str, int]] = None,
+) -> Dict[str, int]:
+    """Neyman allocation: draw from each stratum in proportion to size times SD.
+
+    Strata missing from ``stratum_sd`` use the pooled SD, and every SD is
+    floored at ``SD_FLOOR_FRACTION * pooled_sd``. If all weights are zero the
+    wave falls back to proportional allocation. Non-empty strata with no
+    papers in ``sampled`` first get one guaranteed draw each, largest first,
+    so small strata are not left out of the estimate.
+
+    >>> seen = dict.fromkeys("abc", 1)
+    >>> pools = {"a": [1] * 30, "b": [1] * 30}
+    >>> allocate_wave(pools, {"a": 30, "b": 10}, {"a": 1.0, "b": 2.0}, 1.0, 10, seen)
+    {'a': 6, 'b': 4}
+
+    Quota that an exhausted stratum cannot absorb moves to the others, and
+    empty pools are skipped:
+
+    >>> pools = {"a": list(range(30)), "b": list(range(3)), "c": []}
+    >>> allocate_wave(pools, {"a": 30, "b": 30, "c": 5}, {"a": 1.0}, 1.0, 10, seen)
+    {'a': 7, 'b': 3}
+
+    A zero-SD stratum keeps a floor weight instead of being starved:
+
+    >>> pools = {"a": [1] * 10, "b": [1] * 10}
+    >>> allocate_wave(pools, {"a": 10, "b": 10}, {"a": 0.0}, 1.0, 10, seen)
+    {'a': 2, 'b': 8}
+    >>> allocate_wave(pools, {"a": 30, "b": 10}, {}, 0.0, 4, seen)
+    {'a': 3, 'b': 1}
+
+    Unsampled small strata get a draw even when Neyman would give them none:
+
+    >>> pools = {"a": [1] * 100, "b": [1] * 5, "c": [1] * 5}
+    >>> allocate_wave(pools, {"a": 900, "b": 5, "c": 5}, {}, 1.0, 4, sampled={"a": 10})
+    {'a': 2, 'b': 1, 'c': 1}
+    """
+    sampled = sampled or {}
+    forced = {}
+    unsampled = [s for s, pool in pools.items() if pool and not sampled.get(s)]
+    for stratum in sorted(unsampled, key=lambda s: stratum_sizes[s], reverse=True)[:wave_size]:
+        forced[stratum] = 1
+    wave_size -= len(forced)
+    pools = {s: pool[forced.get(s, 0):] for s, pool in pools.items()}
+
+    sd_floor = SD_FLOOR_FRACTION * pooled_sd
+    weights = {}
+    for stratum, pool in pools.items():
+        if not pool:
+            continue
+        sd = max(stratum_sd.get(stratum, pooled_sd), sd_floor)
+        weights[stratum] = stratum_sizes[stratum] * sd
+    total = sum(weights.values())
+    if total <= 0:
+        weights = {stratum: float(stratum_sizes[stratum]) for stratum in weights}
+        total = sum(weights.values())
+    if total <= 0:
+        return forced
+
+    quotas = {stratum: wave_size * w / total for stratum, w in weights.items()}
+    allocation = {
+        stratum: min(int(quota), len(pools[stratum])) for stratum, quota in quotas.items()
+    }
+    # Hand out the remainder by largest fractional quota, skipping exhausted strata.
+    order = sorted(quotas, key=lambda s: quotas[s] - int(quotas[s]), reverse=True)
+    remaining = wave_size - sum(allocation.values())
+    while remaining > 0:
+        progressed = False
+        for stratum in order:
+            if remaining == 0:
+                break
+            if allocation[stratum] < len(pools[stratum]):
+                allocation[stratum] += 1
+                remaining -= 1
+                progressed = True
+        if not progressed:
+            break
+    for stratum, count in forced.items():
+        allocation[stratum] = allocation.get(stratum, 0) + count
+    return allocation
@@ -14,6 +14,8 @@ from scipy import stats
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
+from adaptive_sampling import stratified_mean, stratum_label
+
 WORKSPACE_ROOT = Path(__file__).resolve().parents[1]
 RESULTS_DIR = WORKSPACE_ROOT / "results"
 MODEL_OUTPUTS_DIR = RESULTS_DIR / "model_outputs"
@@ -26,6 +28,8 @@ REVISIONS_PATH = MODEL_OUTPUTS_DIR / "revisions.jsonl"
 JUDGMENTS_PATH = MODEL_OUTPUTS_DIR / "judgments.jsonl"
 SAMPLES_PATH = RESULTS_DIR / "sample_papers.jsonl"
 
+METRICS = ["clarity", "novelty", "overall"]
+
 
 def read_jsonl(path: Path) -> List[Dict[str, Any]]:
     with path.open("r", encoding="utf-8") as handle:
@@ -49,14 +53,87 @@ def to_int(value: Any) -> float:
     return float(digits) if digits else float("nan")
 
 
+def improvement_table(judgments: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Pivot judgments to one row per paper with per-condition score deltas."""
+    judgment_df = pd.DataFrame(judgments)
+    for metric in METRICS:
+        judgment_df[metric] = judgment_df["response"].apply(lambda r: to_int(r.get(metric)))
+
+    pivot = judgment_df.pivot(index="paper_id", columns="variant", values=METRICS)
+    pivot.columns = [f"{metric}_{variant}" for metric, variant in pivot.columns]
+    pivot = pivot.reset_index()
+
+    for metric in METRICS:
+        pivot[f"delta_{metric}_single"] = pivot[f"{metric}_single"] - pivot[f"{metric}_original"]
+        pivot[f"delta_{metric}_multi"] = pivot[f"{metric}_multi"] - pivot[f"{metric}_original"]
+    return pivot
+
+
+def improvement_stats(pivot: pd.DataFrame, alpha: float = 0.05) -> List[Dict[str, Any]]:
+    """Paired multi-minus-single comparison of deltas, with a CI on the mean difference."""
+    stats_rows = []
+    for metric in METRICS:
+        paired = pivot[[f"delta_{metric}_single", f"delta_{metric}_multi"]].dropna()
+        delta_single = paired[f"delta_{metric}_single"]
+        delta_multi = paired[f"delta_{metric}_multi"]
+        t_stat, p_val = stats.ttest_rel(delta_multi, delta_single)
+        diff = delta_multi.values - delta_single.values
+        n = len(diff)
+        mean_diff = float(np.mean(diff)) if n else float("nan")
+        sd_diff = float(np.std(diff, ddof=1)) if n > 1 else float("nan")
+        cohen_d = mean_diff / sd_diff if n > 1 and sd_diff > 0 else float("nan")
+        half_width = (
+            float(stats.t.ppf(1 - alpha / 2, n - 1) * sd_diff / np.sqrt(n))
+            if n > 1
+            else float("nan")
+        )
+        stats_rows.append(
+            {
+                "metric": metric,
+                "n": n,
+                "mean_delta_single": float(np.mean(delta_single)),
+                "mean_delta_multi": float(np.mean(delta_multi)),
+                "t_stat": float(t_stat),
+                "p_value": float(p_val),
+                "cohen_d": cohen_d,
+                "mean_diff": mean_diff,
+                "sd_diff": sd_diff,
+                "ci_low": mean_diff - half_width,
+                "ci_high": mean_diff + half_width,
+            }
+        )
+    return stats_rows
+
+
+def stratified_improvement_stats(
+    pivot: pd.DataFrame,
+    paper_strata: Dict[str, str],
+    stratum_sizes: Dict[str, int],
+    alpha: float = 0.05,
+) -> List[Dict[str, Any]]:
+    """Stratum-weighted multi-minus-single effect; see ``population_coverage``."""
+    strata = pivot["paper_id"].map(paper_strata)
+    stats_rows = []
+    for metric in METRICS:
+        diff = pivot[f"delta_{metric}_multi"] - pivot[f"delta_{metric}_single"]
+        row = stratified_mean(diff.tolist(), strata.tolist(), stratum_sizes, alpha=alpha)
+        stats_rows.append({"metric": metric, **row})
+    return stats_rows
+
+
 def main() -> None:
     ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
     PLOTS_DIR.mkdir(parents=True, exist_ok=True)
 
     samples = read_jsonl(SAMPLES_PATH)
+    sample_ids = {paper["paper_id"] for paper in samples}
     reviews = dedupe(read_jsonl(REVIEWS_PATH), ["paper_id", "model"])
     revisions = dedupe(read_jsonl(REVISIONS_PATH), ["paper_id", "condition"])
-    judgments = dedupe(read_jsonl(JUDGMENTS_PATH), ["paper_id", "variant"])
+    judgments = [
+        row
+        for row in dedupe(read_jsonl(JUDGMENTS_PATH), ["paper_id", "variant"])
+        if row["paper_id"] in sample_ids
+    ]
 
     sample_df = pd.DataFrame(samples)
     config = json.loads(CONFIG_PATH.read_text(encoding="utf-8")) if CONFIG_PATH.exists() else {}
@@ -118,38 +195,21 @@ def main() -> None:
     disagreement_df = pd.DataFrame(disagreement_rows)
 
     # Revision quality improvements
-    judgment_df = pd.DataFrame(judgments)
-    for metric in ["clarity", "novelty", "overall"]:
-        judgment_df[metric] = judgment_df["response"].apply(lambda r: to_int(r.get(metric)))
-
-    pivot = judgment_df.pivot(index="paper_id", columns="variant", values=["clarity", "novelty", "overall"])
-    pivot.columns = [f"{metric}_{variant}" for metric, variant in pivot.columns]
-    pivot = pivot.reset_index()
-
-    for metric in ["clarity", "novelty", "overall"]:
-        pivot[f"delta_{metric}_single"] = pivot[f"{metric}_single"] - pivot[f"{metric}_original"]
-        pivot[f"delta_{metric}_multi"] = pivot[f"{metric}_multi"] - pivot[f"{metric}_original"]
+    pivot = improvement_table(judgments)
+    stats_rows = improvement_stats(pivot)
+    stats_df = pd.DataFrame(stats_rows)
 
-    stats_rows = []
-    for metric in ["clarity", "novelty", "overall"]:
-        delta_single = pivot[f"delta_{metric}_single"].dropna()
-        delta_multi = pivot[f"delta_{metric}_multi"].dropna()
-        t_stat, p_val = stats.ttest_rel(delta_single, delta_multi)
-        diff = delta_multi.values - delta_single.values
-        cohen_d = float(np.mean(diff) / np.std(diff, ddof=1)) if len(diff) > 1 else float("nan")
-        stats_rows.append(
-            {
-                "metric": metric,
-                "mean_delta_single": float(np.mean(delta_single)),
-                "mean_delta_multi": float(np.mean(delta_multi)),
-                "t_stat": float(t_stat),
-                "p_value": float(p_val),
-                "cohen_d": cohen_d,
-            }
+    # Adaptive runs oversample noisy strata, so reweight to population shares.
+    stratified_rows = []
+    if config.get("sampling") == "adaptive":
+        paper_strata = {
+            paper["paper_id"]: stratum_label(paper["year"], paper["decision"])
+            for paper in samples
+        }
+        stratified_rows = stratified_improvement_stats(
+            pivot, paper_strata, config["adaptive"]["stratum_sizes"]
         )
 
-    stats_df = pd.DataFrame(stats_rows)
-
     # Save metrics
     data_quality = {
         "sample_size": int(sample_df.shape[0]),
@@ -166,6 +226,8 @@ def main() -> None:
         "suggestion_similarity": pd.DataFrame(similarity_rows).describe().to_dict(),
         "improvement_stats": stats_rows,
     }
+    if stratified_rows:
+        metrics["stratified_improvement_stats"] = stratified_rows
     (ANALYSIS_DIR / "metrics.json").write_text(
         json.dumps(metrics, indent=2), encoding="utf-8"
     )
@@ -214,6 +276,10 @@ def main() -> None:
     # Save summary tables
     disagreement_df.to_csv(ANALYSIS_DIR / "review_disagreement.csv", index=False)
     stats_df.to_csv(ANALYSIS_DIR / "improvement_stats.csv", index=False)
+    if stratified_rows:
+        pd.DataFrame(stratified_rows).to_csv(
+            ANALYSIS_DIR / "improvement_stats_stratified.csv", index=False
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+"""Run the review pipeline in waves until the single-vs-multi effect is precise enough."""
+from __future__ import annotations
+
+import random
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+from datasets import load_from_disk
+
+from adaptive_sampling import (
+    MIN_STRATUM_OBS,
+    allocate_wave,
+    paired_power,
+    stopping_reason,
+    stratum_label,
+)
+from analyze_results import improvement_table, stratified_improvement_stats
+from run_experiment import (
+    DATASET_PATH,
+    MODEL_OUTPUTS_DIR,
+    SEED,
+    load_existing_outputs,
+    paper_record,
+    process_paper,
+    set_seed,
+    write_config,
+    write_samples,
+)
+
+TARGET_METRIC = "overall"
+WAVE_SIZE = 10
+MIN_PAPERS = 20
+MAX_PAPERS = 200
+ALPHA = 0.05
+# Only the target for the selected STOP_ON mode is used:
+# "precision" stops once the stratified CI on mean(delta_multi - delta_single)
+# has half-width <= TARGET_CI_HALF_WIDTH; "power" stops once a t-test on that
+# estimate has TARGET_POWER against a true difference of MIN_EFFECT points.
+STOP_ON = "precision"
+TARGET_CI_HALF_WIDTH = 0.25
+TARGET_POWER = 0.8
+MIN_EFFECT = 0.5
+# Share of the population that must lie in sampled strata before stopping;
+# below 1.0 the estimate leaves out the unsampled year/decision cells.
+MIN_COVERAGE = 1.0
+
+
+def main() -> None:
+    set_seed(SEED)
+    MODEL_OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    dataset = load_from_disk(DATASET_PATH)["raw"]
+    strata = [
+        stratum_label(year, decision)
+        for year, decision in zip(dataset["year"], dataset["decision"])
+    ]
+    pools: Dict[str, List[int]] = defaultdict(list)
+    for idx, stratum in enumerate(strata):
+        pools[stratum].append(idx)
+    for pool in pools.values():
+        random.shuffle(pool)
+    stratum_sizes = {stratum: len(pool) for stratum, pool in pools.items()}
+
+    existing_reviews, existing_revisions, existing_judgments = load_existing_outputs()
+    review_usage = defaultdict(int)
+
+    sample_rows: List[Dict[str, Any]] = []
+    paper_strata: Dict[str, str] = {}
+    sampled_counts: Dict[str, int] = defaultdict(int)
+    stratum_sd: Dict[str, float] = {}
+    pooled_sd = 1.0
+    waves: List[Dict[str, Any]] = []
+    stop_reason = "budget"
+
+    settings = {
+        "target_metric": TARGET_METRIC,
+        "wave_size": WAVE_SIZE,
+        "min_papers": MIN_PAPERS,
+        "max_papers": MAX_PAPERS,
+        "alpha": ALPHA,
+        "stop_on": STOP_ON,
+        "target_ci_half_width": TARGET_CI_HALF_WIDTH,
+        "target_power": TARGET_POWER,
+        "min_effect": MIN_EFFECT,
+        "min_coverage": MIN_COVERAGE,
+        "stratum_sizes": stratum_sizes,
+    }
+    # Write the config before any sampling so an interrupted run never leaves
+    # the adaptive sample next to a fixed-run config.
+    write_samples(sample_rows)
+    write_config(
+        0,
+        sampling="adaptive",
+        adaptive={**settings, "stop_reason": None, "waves": waves},
+    )
+
+    while len(sample_rows) < MAX_PAPERS:
+        wave_size = min(WAVE_SIZE, MAX_PAPERS - len(sample_rows))
+        allocation = allocate_wave(
+            pools, stratum_sizes, stratum_sd, pooled_sd, wave_size, sampled_counts
+        )
+        if not any(allocation.values()):
+            stop_reason = "exhausted"
+            break
+
+        for stratum, count in allocation.items():
+            for _ in range(count):
+                paper = paper_record(dataset[pools[stratum].pop()])
+                process_paper(
+                    paper,
+                    existing_reviews,
+                    existing_revisions,
+                    existing_judgments,
+                    review_usage,
+                )
+                sample_rows.append(paper)
+                paper_strata[paper["paper_id"]] = stratum
+                sampled_counts[stratum] += 1
+        write_samples(sample_rows)
+
+        judgments = [
+            record
+            for (paper_id, _), record in existing_judgments.items()
+            if paper_id in paper_strata
+        ]
+        pivot = improvement_table(judgments)
+        estimate = next(
+            row
+            for row in stratified_improvement_stats(
+                pivot, paper_strata, stratum_sizes, alpha=ALPHA
+            )
+            if row["metric"] == TARGET_METRIC
+        )
+        power = paired_power(MIN_EFFECT, estimate["se"], estimate["df"], alpha=ALPHA)
+
+        diffs = (
+            pivot[f"delta_{TARGET_METRIC}_multi"] - pivot[f"delta_{TARGET_METRIC}_single"]
+        ).dropna()
+        if len(diffs) > 1:
+            pooled_sd = float(np.std(diffs, ddof=1))
+        by_stratum = diffs.groupby(pivot["paper_id"].map(paper_strata)).agg(["std", "count"])
+        stratum_sd = {
+            stratum: float(sd)
+            for stratum, (sd, count) in by_stratum.iterrows()
+            if count >= MIN_STRATUM_OBS
+        }
+
+        waves.append(
+            {
+                "wave": len(waves) + 1,
+                "n": estimate["n"],
+                "mean_diff": estimate["mean_diff"],
+                "se": estimate["se"],
+                "ci_low": estimate["ci_low"],
+                "ci_high": estimate["ci_high"],
+                "population_coverage": estimate["population_coverage"],
+                "power": power,
+                "allocation": {stratum: count for stratum, count in allocation.items() if count},
+            }
+        )
+        write_config(
+            len(sample_rows),
+            sampling="adaptive",
+            adaptive={**settings, "stop_reason": None, "waves": waves},
+        )
+
+        reason = stopping_reason(
+            estimate,
+            power,
+            STOP_ON,
+            MIN_PAPERS,
+            TARGET_CI_HALF_WIDTH,
+            TARGET_POWER,
+            min_coverage=MIN_COVERAGE,
+        )
+        if reason:
+            stop_reason = reason
+            break
+
+    write_config(
+        len(sample_rows),
+        sampling="adaptive",
+        adaptive={**settings, "stop_reason": stop_reason, "waves": waves},
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@ REVISIONS_PATH = MODEL_OUTPUTS_DIR / "revisions.jsonl"
 JUDGMENTS_PATH = MODEL_OUTPUTS_DIR / "judgments.jsonl"
 SAMPLES_PATH = RESULTS_DIR / "sample_papers.jsonl"
 CONFIG_PATH = RESULTS_DIR / "config.json"
+DATASET_PATH = "datasets/openreview_iclr_peer_reviews"
 
 REVIEWER_MODELS = [
     "anthropic/claude-sonnet-4.5",
@@ -147,32 +148,28 @@ def call_json(
         return parsed, repair_content, merged_usage
 
 
-def main() -> None:
-    set_seed(SEED)
-    MODEL_OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
-
-    dataset = load_from_disk("datasets/openreview_iclr_peer_reviews")["raw"]
-    indices = list(range(len(dataset)))
-    random.shuffle(indices)
-    sample_indices = indices[:SAMPLE_SIZE]
+def paper_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "paper_id": row["paper_id"],
+        "title": row["title"],
+        "abstract": row["abstract"],
+        "year": row["year"],
+        "decision": row["decision"],
+    }
 
-    sample_rows = []
-    for idx in sample_indices:
-        row = dataset[idx]
-        sample_rows.append(
-            {
-                "paper_id": row["paper_id"],
-                "title": row["title"],
-                "abstract": row["abstract"],
-                "year": row["year"],
-                "decision": row["decision"],
-            }
-        )
 
+def write_samples(sample_rows: List[Dict[str, Any]]) -> None:
     with SAMPLES_PATH.open("w", encoding="utf-8") as handle:
         for row in sample_rows:
             handle.write(json.dumps(row, ensure_ascii=True) + "\n")
 
+
+def load_existing_outputs() -> Tuple[
+    Dict[Tuple[str, str], Dict[str, Any]],
+    Dict[Tuple[str, str], Dict[str, Any]],
+    Dict[Tuple[str, str], Dict[str, Any]],
+]:
+    """Load cached model outputs, dropping records that should be re-run."""
     existing_reviews = {
         (r["paper_id"], r["model"]): r for r in read_jsonl(REVIEWS_PATH)
     }
@@ -210,166 +207,200 @@ def main() -> None:
         ):
             existing_judgments.pop(key, None)
 
-    review_usage = defaultdict(int)
-
-    for paper in sample_rows:
-        title = paper["title"]
-        abstract = paper["abstract"]
-        paper_id = paper["paper_id"]
-
-        for model in REVIEWER_MODELS:
-            if (paper_id, model) in existing_reviews:
-                continue
-            messages = build_review_prompt(title, abstract)
+    return existing_reviews, existing_revisions, existing_judgments
+
+
+def process_paper(
+    paper: Dict[str, Any],
+    existing_reviews: Dict[Tuple[str, str], Dict[str, Any]],
+    existing_revisions: Dict[Tuple[str, str], Dict[str, Any]],
+    existing_judgments: Dict[Tuple[str, str], Dict[str, Any]],
+    review_usage: Dict[str, int],
+) -> None:
+    """Run reviews, revisions, and judgments for one paper, skipping cached calls."""
+    title = paper["title"]
+    abstract = paper["abstract"]
+    paper_id = paper["paper_id"]
+
+    for model in REVIEWER_MODELS:
+        if (paper_id, model) in existing_reviews:
+            continue
+        messages = build_review_prompt(title, abstract)
+        parsed, content, usage = call_json(
+            model=model,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=800,
+        )
+        if not isinstance(parsed, dict) or not all(
+            k in parsed for k in ("score", "strengths", "weaknesses", "suggestions")
+        ):
+            strict_system = (
+                "Return only JSON with keys score (1-10 integer), strengths "
+                "(list), weaknesses (list), suggestions (list), summary (string)."
+            )
+            strict_messages = [
+                {"role": "system", "content": strict_system},
+                {"role": "user", "content": messages[1]["content"]},
+            ]
             parsed, content, usage = call_json(
                 model=model,
-                messages=messages,
+                messages=strict_messages,
                 temperature=0.2,
                 max_tokens=800,
             )
-            if not isinstance(parsed, dict) or not all(
-                k in parsed for k in ("score", "strengths", "weaknesses", "suggestions")
-            ):
-                strict_system = (
-                    "Return only JSON with keys score (1-10 integer), strengths "
-                    "(list), weaknesses (list), suggestions (list), summary (string)."
-                )
-                strict_messages = [
-                    {"role": "system", "content": strict_system},
-                    {"role": "user", "content": messages[1]["content"]},
-                ]
-                parsed, content, usage = call_json(
-                    model=model,
-                    messages=strict_messages,
-                    temperature=0.2,
-                    max_tokens=800,
-                )
-            record = {
-                "paper_id": paper_id,
-                "model": model,
-                "response": parsed,
-                "raw": content,
-                "usage": usage,
-                "timestamp": datetime.utcnow().isoformat(),
-            }
-            append_jsonl(REVIEWS_PATH, [record])
-            existing_reviews[(paper_id, model)] = record
-            for key, val in usage.items():
-                if val is not None:
-                    review_usage[key] += val
-
-        # Build feedback strings
-        reviewer_feedback = []
-        for model in REVIEWER_MODELS:
-            review = existing_reviews[(paper_id, model)]["response"]
-            suggestions = review.get("suggestions", [])
-            if isinstance(suggestions, list):
-                suggestions_text = "\n".join(f"- {s}" for s in suggestions)
-            else:
-                suggestions_text = str(suggestions)
-            reviewer_feedback.append(
-                f"Reviewer ({model}) suggestions:\n{suggestions_text}"
-            )
+        record = {
+            "paper_id": paper_id,
+            "model": model,
+            "response": parsed,
+            "raw": content,
+            "usage": usage,
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+        append_jsonl(REVIEWS_PATH, [record])
+        existing_reviews[(paper_id, model)] = record
+        for key, val in usage.items():
+            if val is not None:
+                review_usage[key] += val
+
+    # Build feedback strings
+    reviewer_feedback = []
+    for model in REVIEWER_MODELS:
+        review = existing_reviews[(paper_id, model)]["response"]
+        suggestions = review.get("suggestions", [])
+        if isinstance(suggestions, list):
+            suggestions_text = "\n".join(f"- {s}" for s in suggestions)
+        else:
+            suggestions_text = str(suggestions)
+        reviewer_feedback.append(
+            f"Reviewer ({model}) suggestions:\n{suggestions_text}"
+        )
 
-        feedback_multi = "\n\n".join(reviewer_feedback)
-        feedback_single = None
-        for model in REVIEWER_MODELS:
-            if model == SINGLE_REVIEWER:
-                feedback_single = reviewer_feedback[REVIEWER_MODELS.index(model)]
-                break
+    feedback_multi = "\n\n".join(reviewer_feedback)
+    feedback_single = None
+    for model in REVIEWER_MODELS:
+        if model == SINGLE_REVIEWER:
+            feedback_single = reviewer_feedback[REVIEWER_MODELS.index(model)]
+            break
 
-        revision_inputs = [
-            ("single", feedback_single),
-            ("multi", feedback_multi),
-        ]
+    revision_inputs = [
+        ("single", feedback_single),
+        ("multi", feedback_multi),
+    ]
 
-        for condition, feedback in revision_inputs:
-            if (paper_id, condition) in existing_revisions:
-                continue
-            messages = build_revision_prompt(title, abstract, feedback)
+    for condition, feedback in revision_inputs:
+        if (paper_id, condition) in existing_revisions:
+            continue
+        messages = build_revision_prompt(title, abstract, feedback)
+        parsed, content, usage = call_json(
+            model=AUTHOR_MODEL,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=900,
+        )
+        if not isinstance(parsed, dict) or not parsed.get("revised_abstract"):
+            strict_system = (
+                "Return only JSON with keys revised_abstract (string) and "
+                "change_log (list). No extra text."
+            )
+            strict_messages = [
+                {"role": "system", "content": strict_system},
+                {"role": "user", "content": messages[1]["content"]},
+            ]
             parsed, content, usage = call_json(
                 model=AUTHOR_MODEL,
-                messages=messages,
-                temperature=0.3,
+                messages=strict_messages,
+                temperature=0.2,
                 max_tokens=900,
             )
-            if not isinstance(parsed, dict) or not parsed.get("revised_abstract"):
-                strict_system = (
-                    "Return only JSON with keys revised_abstract (string) and "
-                    "change_log (list). No extra text."
-                )
-                strict_messages = [
-                    {"role": "system", "content": strict_system},
-                    {"role": "user", "content": messages[1]["content"]},
-                ]
-                parsed, content, usage = call_json(
-                    model=AUTHOR_MODEL,
-                    messages=strict_messages,
-                    temperature=0.2,
-                    max_tokens=900,
-                )
-            record = {
-                "paper_id": paper_id,
-                "condition": condition,
-                "model": AUTHOR_MODEL,
-                "response": parsed,
-                "raw": content,
-                "usage": usage,
-                "timestamp": datetime.utcnow().isoformat(),
-            }
-            append_jsonl(REVISIONS_PATH, [record])
-            existing_revisions[(paper_id, condition)] = record
-
-        # Judge original and revised abstracts
-        variants: List[Tuple[str, str]] = [
-            ("original", abstract),
-            (
-                "single",
-                existing_revisions[(paper_id, "single")]["response"][
-                    "revised_abstract"
-                ],
-            ),
-            (
-                "multi",
-                existing_revisions[(paper_id, "multi")]["response"][
-                    "revised_abstract"
-                ],
-            ),
-        ]
-
-        for variant, text in variants:
-            if (paper_id, variant) in existing_judgments:
-                continue
-            messages = build_judge_prompt(title, text)
-            parsed, content, usage = call_json(
-                model=JUDGE_MODEL,
-                messages=messages,
-                temperature=0.0,
-                max_tokens=400,
-            )
-            record = {
-                "paper_id": paper_id,
-                "variant": variant,
-                "model": JUDGE_MODEL,
-                "response": parsed,
-                "raw": content,
-                "usage": usage,
-                "timestamp": datetime.utcnow().isoformat(),
-            }
-            append_jsonl(JUDGMENTS_PATH, [record])
-            existing_judgments[(paper_id, variant)] = record
+        record = {
+            "paper_id": paper_id,
+            "condition": condition,
+            "model": AUTHOR_MODEL,
+            "response": parsed,
+            "raw": content,
+            "usage": usage,
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+        append_jsonl(REVISIONS_PATH, [record])
+        existing_revisions[(paper_id, condition)] = record
+
+    # Judge original and revised abstracts
+    variants: List[Tuple[str, str]] = [
+        ("original", abstract),
+        (
+            "single",
+            existing_revisions[(paper_id, "single")]["response"][
+                "revised_abstract"
+            ],
+        ),
+        (
+            "multi",
+            existing_revisions[(paper_id, "multi")]["response"][
+                "revised_abstract"
+            ],
+        ),
+    ]
 
+    for variant, text in variants:
+        if (paper_id, variant) in existing_judgments:
+            continue
+        messages = build_judge_prompt(title, text)
+        parsed, content, usage = call_json(
+            model=JUDGE_MODEL,
+            messages=messages,
+            temperature=0.0,
+            max_tokens=400,
+        )
+        record = {
+            "paper_id": paper_id,
+            "variant": variant,
+            "model": JUDGE_MODEL,
+            "response": parsed,
+            "raw": content,
+            "usage": usage,
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+        append_jsonl(JUDGMENTS_PATH, [record])
+        existing_judgments[(paper_id, variant)] = record
+
+
+def write_config(sample_size: int, **extra: Any) -> None:
     config = {
         "seed": SEED,
-        "sample_size": SAMPLE_SIZE,
+        "sample_size": sample_size,
         "reviewer_models": REVIEWER_MODELS,
         "single_reviewer": SINGLE_REVIEWER,
         "author_model": AUTHOR_MODEL,
         "judge_model": JUDGE_MODEL,
         "timestamp": datetime.utcnow().isoformat(),
     }
+    config.update(extra)
     CONFIG_PATH.write_text(json.dumps(config, indent=2), encoding="utf-8")
 
 
+def main() -> None:
+    set_seed(SEED)
+    MODEL_OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    dataset = load_from_disk(DATASET_PATH)["raw"]
+    indices = list(range(len(dataset)))
+    random.shuffle(indices)
+    sample_indices = indices[:SAMPLE_SIZE]
+
+    sample_rows = [paper_record(dataset[idx]) for idx in sample_indices]
+    write_samples(sample_rows)
+
+    existing_reviews, existing_revisions, existing_judgments = load_existing_outputs()
+    review_usage = defaultdict(int)
+
+    for paper in sample_rows:
+        process_paper(
+            paper, existing_reviews, existing_revisions, existing_judgments, review_usage
+        )
+
+    write_config(SAMPLE_SIZE)
+
+
 if __name__ == "__main__":
     main()